@@ -1,9 +1,17 @@
 from __future__ import annotations
+import atexit
+import hashlib
+import heapq
+import re
 import sqlite3
+import sys
+import threading
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for
+from types import MappingProxyType
+from flask import Flask, make_response, render_template, request, redirect, url_for
 from flask import abort
 
 APP_DIR = Path(__file__).parent
@@ -11,8 +19,10 @@ DB_PATH = APP_DIR / "tama.db"
 
 app = Flask(__name__)
 
-STAT_KEYS = ["strength", "stamina", "intelligence", "wealth", "discipline", "consistency"]
-ACTION_TYPES = ["strength", "stamina", "intelligence", "wealth", "discipline"]
+STAT_KEYS = ("strength", "stamina", "intelligence", "wealth", "discipline", "consistency")
+ACTION_TYPES = ("strength", "stamina", "intelligence", "wealth", "discipline")
+# layer_flags용 키 ("strength_20", "strength_50") 미리 만들어 둠
+LAYER_KEYS = tuple((f"{k}_20", f"{k}_50") for k in STAT_KEYS)
 
 
 TYPE_KO = {
@@ -23,6 +33,16 @@ TYPE_KO = {
     "discipline": "금주/식단",
 }
 
+# 1위 스탯 → 클래스, 2위 스탯 → 특성 이름
+CLASS_BY_STAT = {
+    "strength": "보디빌더",
+    "stamina": "러너",
+    "intelligence": "학자",
+    "wealth": "재력가",
+    "discipline": "현자",
+    "consistency": "맑은눈",  # 꾸준함 1위면 맑은눈 성향
+}
+
 GAIN = {
     "strength": 5,        # 근력
     "stamina": 5,         # 유산소
@@ -30,35 +50,94 @@ GAIN = {
     "wealth": 7,          # 적금/투자 성공
     "discipline": 4,      # 금주/식단
 }
+# 행동 타입 문자열 → intern된 같은 문자열
+TYPE_INTERN = {sys.intern(t): sys.intern(t) for t in ACTION_TYPES}
+
 EXP_PER_ACTION = 10
 CONSISTENCY_PER_DAY = 2
 
+# 레벨별 필요 EXP 표(자주 쓰는 구간만 미리 계산)
+_NEED_EXP = tuple(100 + (level * 20) for level in range(1024))
+
 def need_exp_for_next(level: int) -> int:
+    if level < len(_NEED_EXP):
+        return _NEED_EXP[level]
     return 100 + (level * 20)
 
+# "그날 1개 이상 입력" 연속일수 기준 보너스 (EXP만): (최소 streak, 보너스) 큰 것부터
+STREAK_BONUS_TIERS = ((30, 30), (10, 30), (5, 15), (2, 5))
+# streak 0..30 → 보너스 표를 미리 만들어 두고 조회만 함(30 이상은 30과 같음)
+_STREAK_BONUS = tuple(
+    next((bonus for min_streak, bonus in STREAK_BONUS_TIERS if s >= min_streak), 0)
+    for s in range(STREAK_BONUS_TIERS[0][0] + 1)
+)
+
 def streak_bonus_exp(streak: int) -> int:
-    # "그날 1개 이상 입력" 연속일수 기준 보너스 (EXP만)
-    if streak >= 30:
-        return 30
-    if streak >= 10:
-        return 30
-    if streak >= 5:
-        return 15
-    if streak >= 2:
-        return 5
-    return 0
+    return _STREAK_BONUS[min(streak, len(_STREAK_BONUS) - 1)]
 
 def today_str() -> str:
     return date.today().isoformat()
 
+@lru_cache(maxsize=4096)
 def parse_date(s: str) -> date:
-    return datetime.strptime(s, "%Y-%m-%d").date()
+    # 같은 날짜 문자열을 반복해서 파싱하므로 캐시(date는 불변이라 공유해도 안전)
+    # YYYY-MM-DD 고정 형식이라 strptime 대신 잘라서 변환(형식이 다르면 ValueError)
+    # int()는 부호/공백/비ASCII 숫자도 받아주므로 ASCII 숫자인지 먼저 확인
+    if (len(s) != 10 or not s.isascii() or s[4] != "-" or s[7] != "-"
+            or not (s[0:4] + s[5:7] + s[8:10]).isdigit()):
+        raise ValueError(f"invalid date: {s!r}")
+    return date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+# 단일 사용자 로컬 앱용 SQLite 설정: WAL + NORMAL(커밋당 fsync 감소), 임시 정렬은 메모리, mmap/캐시 확대
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=30000000",
+    "PRAGMA cache_size=-20000",
+)
+
+_DATE_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+def is_valid_date(s: str) -> bool:
+    # YYYY-MM-DD 형식(정규식)이고 실제로 있는 날짜인지(2월 30일 등 제외)
+    if not _DATE_RE.fullmatch(s):
+        return False
+    try:
+        parse_date(s)
+    except ValueError:
+        return False
+    return True
+
+_local = threading.local()
 
 def db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # 스레드마다 연결을 한 번만 열고 계속 재사용(페이지 캐시 유지, 요청마다 open/close 안 함)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        # 연결을 처음 열 때 한 번만 설정
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
     return conn
 
+@atexit.register
+def close_db():
+    # 다른 스레드의 연결은 스레드 종료 시 threading.local과 함께 정리됨
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@app.teardown_appcontext
+def rollback_pending(exc):
+    # 연결은 닫지 않고, 커밋 안 된 트랜잭션만 정리
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
 def init_db():
     conn = db()
     cur = conn.cursor()
@@ -97,6 +176,23 @@ def init_db():
     )
     """)
 
+    # 자주 쓰는 WHERE/ORDER BY용 인덱스
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_actions_date ON actions(date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_actions_type_date ON actions(type, date)")
+
+    # 예전 버전(strptime)은 "2025-1-5" 같은 0 없는 날짜도 저장했음 → YYYY-MM-DD로 정리
+    # (parse_date와 문자열 날짜 비교가 YYYY-MM-DD를 전제로 하므로)
+    legacy = cur.execute("""
+        SELECT id, date FROM actions
+        WHERE date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    """).fetchall()
+    for r in legacy:
+        try:
+            fixed = datetime.strptime(r["date"], "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            continue
+        cur.execute("UPDATE actions SET date=? WHERE id=?", (fixed, r["id"]))
+
     # create default profile (single user)
     cur.execute("SELECT COUNT(*) AS c FROM profile")
     if cur.fetchone()["c"] == 0:
@@ -105,15 +201,37 @@ def init_db():
         VALUES (1, 1, 0, 0, 0, 0, 0, 0, 0, 0, ?)
         """, (today_str(),))
     conn.commit()
-    conn.close()
+
+_initialized = False
+
+def _ensure_init():
+    global _initialized
+    if not _initialized:
+        init_db()
+        _initialized = True
+
+# 단일 사용자(id=1) profile 캐시: DB에 쓸 때 같이 갱신(write-through)
+_profile_cache: dict | None = None
+_profile_lock = threading.Lock()
+# profile 읽기 → 계산 → 저장 전체를 감싸는 쓰기 락(동시 요청이 서로의 결과를 덮어쓰지 않게)
+_write_lock = threading.Lock()
 
 def get_profile():
-    conn = db()
-    row = conn.execute("SELECT * FROM profile WHERE id=1").fetchone()
-    conn.close()
-    return dict(row)
+    global _profile_cache
+    with _profile_lock:
+        if _profile_cache is None:
+            conn = db()
+            row = conn.execute("SELECT * FROM profile WHERE id=1").fetchone()
+            _profile_cache = dict(row)
+        return dict(_profile_cache)
 
 def update_profile(p: dict):
+    global _profile_cache
+    with _profile_lock:
+        _write_profile(p)
+        _profile_cache = dict(p, id=1)
+
+def _write_profile(p: dict):
     conn = db()
     conn.execute("""
     UPDATE profile
@@ -125,60 +243,62 @@ def update_profile(p: dict):
         p["streak"], p["last_check_date"]
     ))
     conn.commit()
-    conn.close()
 
 def did_anything_on(d: str) -> bool:
     conn = db()
     row = conn.execute("SELECT 1 FROM actions WHERE date=? LIMIT 1", (d,)).fetchone()
-    conn.close()
     return row is not None
 
 def get_recent_actions(limit: int = 30):
     conn = db()
-    rows = conn.execute("""
+    # 이 쿼리는 sqlite3.Row 대신 튜플로 받아서 바로 풀어 씀
+    cur = conn.cursor()
+    cur.row_factory = None
+    rows = cur.execute("""
         SELECT id, date, type, note
         FROM actions
         ORDER BY date DESC, id DESC
         LIMIT ?
     """, (limit,)).fetchall()
-    conn.close()
 
-    out = []
-    for r in rows:
-        t = r["type"]
-        out.append({
-            "id": r["id"],
-            "date": r["date"],
-            "type": t,
-            "type_ko": TYPE_KO.get(t, t),  # <-- 이게 핵심
-            "note": r["note"] or ""
-        })
-    return out
+    type_ko = TYPE_KO.get
+    return [
+        {"id": i, "date": d, "type": t, "type_ko": type_ko(t, t), "note": n or ""}
+        for i, d, t, n in rows
+    ]
 
 @app.route("/delete", methods=["POST"])
 def delete_action():
-    init_db()
-    action_id = request.form.get("action_id", "").strip()
-    if not action_id.isdigit():
+    try:
+        action_id = int(request.form.get("action_id", ""))
+    except ValueError:
         return redirect(url_for("index"))
 
-    conn = db()
-    conn.execute("DELETE FROM actions WHERE id=?", (int(action_id),))
-    conn.commit()
-    conn.close()
+    with _write_lock:
+        conn = db()
+        conn.execute("DELETE FROM actions WHERE id=?", (action_id,))
+        conn.commit()
+
+        # ✅ 삭제 후 profile 재계산
+        new_p = recompute_profile_from_actions()
+        save_profile_dict(new_p)
+        invalidate_index_cache()
 
-    # ✅ 삭제 후 profile 재계산
-    new_p = recompute_profile_from_actions()
-    save_profile_dict(new_p)
+    return redirect(url_for("index"))
 
+@app.route("/rebuild", methods=["POST"])
+def rebuild_profile():
+    with _write_lock:
+        # actions 기준으로 profile 강제 재계산
+        new_p = recompute_profile_from_actions()
+        save_profile_dict(new_p)
+        invalidate_index_cache()
     return redirect(url_for("index"))
 
 @app.route("/edit/<int:action_id>", methods=["GET"])
 def edit_action(action_id: int):
-    init_db()
     conn = db()
     row = conn.execute("SELECT id, date, type, note FROM actions WHERE id=?", (action_id,)).fetchone()
-    conn.close()
     if not row:
         abort(404)
 
@@ -193,33 +313,32 @@ def edit_action(action_id: int):
 
 @app.route("/update", methods=["POST"])
 def update_action():
-    init_db()
-    action_id = request.form.get("action_id", "").strip()
     new_date = request.form.get("date", "").strip()
     new_type = request.form.get("type", "").strip()
     new_note = request.form.get("note", "").strip()
 
-    if not action_id.isdigit():
+    try:
+        action_id = int(request.form.get("action_id", ""))
+    except ValueError:
         return redirect(url_for("index"))
     if new_type not in TYPE_KO:
         return redirect(url_for("index"))
     # date는 YYYY-MM-DD 형식만 허용(간단 검증)
-    try:
-        _ = parse_date(new_date)
-    except Exception:
+    if not is_valid_date(new_date):
         return redirect(url_for("index"))
 
-    conn = db()
-    conn.execute(
-        "UPDATE actions SET date=?, type=?, note=? WHERE id=?",
-        (new_date, new_type, new_note if new_note else None, int(action_id))
-    )
-    conn.commit()
-    conn.close()
+    with _write_lock:
+        conn = db()
+        conn.execute(
+            "UPDATE actions SET date=?, type=?, note=? WHERE id=?",
+            (new_date, new_type, new_note if new_note else None, action_id)
+        )
+        conn.commit()
 
-    # ✅ 수정 후 profile 재계산
-    new_p = recompute_profile_from_actions()
-    save_profile_dict(new_p)
+        # ✅ 수정 후 profile 재계산
+        new_p = recompute_profile_from_actions()
+        save_profile_dict(new_p)
+        invalidate_index_cache()
 
     return redirect(url_for("index"))
 
@@ -227,17 +346,6 @@ def update_action():
 
 
 # ====== 재계산 함수 ============
-def get_all_actions():
-    conn = db()
-    rows = conn.execute("""
-        SELECT date, type
-        FROM actions
-        ORDER BY date ASC, id ASC
-    """).fetchall()
-    conn.close()
-    return [(r["date"], r["type"]) for r in rows]
-
-
 def recompute_profile_from_actions():
     """
     actions 테이블을 '진실의 원천'으로 삼아 profile을 통째로 재계산한다.
@@ -247,7 +355,6 @@ def recompute_profile_from_actions():
     - 약한 감쇠: 현재 날짜 기준 최근 7일 동안 해당 행동이 없으면 해당 스탯 -2
     - 레벨업: while exp >= need(level)
     """
-    actions = get_all_actions()
     today = today_str()
 
     # 초기화
@@ -264,88 +371,114 @@ def recompute_profile_from_actions():
         "last_check_date": today,
     }
 
-    if not actions:
-        return p
-
-    # 날짜별로 묶기
+    # 날짜별로 묶기(전체 목록을 만들지 않고 커서에서 바로)
+    conn = db()
     by_date = {}
-    for d, t in actions:
-        by_date.setdefault(d, []).append(t)
+    for r in conn.execute("SELECT date, type FROM actions ORDER BY date ASC, id ASC"):
+        t = r["type"]
+        # DB에서 온 문자열을 상수와 같은 객체로 바꿔 dict 조회가 동일성 비교로 끝나게
+        by_date.setdefault(r["date"], []).append(TYPE_INTERN.get(t, t))
+
+    if not by_date:
+        return p
 
-    # actions에 등장한 첫 날짜부터 today까지 하루씩 진행(공백일 포함 → streak 정확)
-    start = parse_date(min(by_date.keys()))
-    end = parse_date(today)
+    # 기록 있는 날만 순서대로 진행(빈 날은 streak 끊김으로만 반영)
+    # today 이후 날짜의 기록은 아직 반영하지 않음
+    # 날짜 비교는 정수(ordinal)로
+    end_ord = parse_date(today).toordinal()
+    sorted_days = [d_str for d_str in sorted(by_date) if d_str <= today]
 
-    d = start
-    while d <= end:
-        d_str = d.isoformat()
-        types_today = by_date.get(d_str, [])
+    prev_ord = None
+    for d_str in sorted_days:
+        o = parse_date(d_str).toordinal()
+        types_today = by_date[d_str]
 
         # 그날 기록 처리(행동 스탯/EXP)
         for t in types_today:
-            if t in GAIN:
-                p[t] += GAIN[t]
+            gain = GAIN.get(t)
+            if gain is not None:
+                p[t] += gain
                 p["exp"] += EXP_PER_ACTION
 
-        # streak/consistency는 "하루에 1개 이상 기록" 기준
-        if len(types_today) > 0:
-            p["consistency"] += CONSISTENCY_PER_DAY
+        # streak/consistency는 "하루에 1개 이상 기록" 기준, 하루라도 비면 streak 리셋
+        if prev_ord is not None and o - prev_ord == 1:
             p["streak"] += 1
-            p["exp"] += streak_bonus_exp(p["streak"])
         else:
-            p["streak"] = 0
+            p["streak"] = 1
+        p["consistency"] += CONSISTENCY_PER_DAY
+        p["exp"] += streak_bonus_exp(p["streak"])
 
         # 레벨업 처리(매일 처리해도 되고, 마지막에 몰아도 되는데 일관성 위해 여기서 처리)
-        while p["exp"] >= need_exp_for_next(p["level"]):
-            p["exp"] -= need_exp_for_next(p["level"])
+        need = need_exp_for_next(p["level"])
+        while p["exp"] >= need:
+            p["exp"] -= need
             p["level"] += 1
+            need = need_exp_for_next(p["level"])
 
-        d += timedelta(days=1)
+        prev_ord = o
 
-    # 감쇠(현재 날짜 기준, 최근 7일 동안 행동 없으면 -2)
-    # last action date를 actions에서 계산
-    last_date_for = {t: None for t in ACTION_TYPES}
-    for d_str, t in actions:
-        if t in last_date_for:
-            last_date_for[t] = d_str
+    # 마지막 기록일 이후 today까지 빈 날이 있으면 streak 끊김
+    if prev_ord is None or prev_ord < end_ord:
+        p["streak"] = 0
 
-    cur_d = parse_date(today)
-    for t in ACTION_TYPES:
-        last_d_str = last_date_for.get(t)
-        if not last_d_str:
-            continue
-        last_d = parse_date(last_d_str)
-        if (cur_d - last_d).days >= 7:
-            p[t] = max(0, p[t] - 2)
+    # 감쇠(현재 날짜 기준, 최근 7일 동안 행동 없으면 -2)
+    apply_weekly_decay(p, today)
 
     return p
 
 
-def save_profile_dict(p: dict):
-    # profile row를 통째로 업데이트
+def streak_before(d_str: str) -> int:
+    # d_str 전날부터 거꾸로 "기록 있는 날"이 몇 일 연속인지
     conn = db()
-    conn.execute("""
-        UPDATE profile
-        SET level=?, exp=?, strength=?, stamina=?, intelligence=?, wealth=?, discipline=?, consistency=?, streak=?, last_check_date=?
-        WHERE id=1
-    """, (
-        p["level"], p["exp"],
-        p["strength"], p["stamina"], p["intelligence"], p["wealth"], p["discipline"], p["consistency"],
-        p["streak"], p["last_check_date"],
-    ))
-    conn.commit()
-    conn.close()
+    expected = parse_date(d_str) - timedelta(days=1)
+    streak = 0
+    for r in conn.execute("SELECT DISTINCT date FROM actions WHERE date < ? ORDER BY date DESC", (d_str,)):
+        if r["date"] != expected.isoformat():
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def apply_action_delta(p: dict, d: str, t: str, first_today: bool):
+    """
+    recompute_profile_from_actions와 같은 규칙으로 d날짜 행동 1개만 profile에 더한다.
+    first_today면 그날 첫 기록 → consistency/streak/streak 보너스 EXP도 반영.
+    (first_today일 때 p["streak"]는 전날까지의 streak이어야 함)
+    """
+    gain = GAIN.get(t)
+    if gain is not None:
+        p[t] += gain
+        p["exp"] += EXP_PER_ACTION
+
+    if first_today:
+        p["consistency"] += CONSISTENCY_PER_DAY
+        p["streak"] += 1
+        p["exp"] += streak_bonus_exp(p["streak"])
+
+    need = need_exp_for_next(p["level"])
+    while p["exp"] >= need:
+        p["exp"] -= need
+        p["level"] += 1
+        need = need_exp_for_next(p["level"])
+    p["last_check_date"] = d
 
-def last_action_date_for_type(t: str) -> str | None:
+
+# actions 기준으로 profile을 마지막으로 맞춘 날짜(재계산/증분 반영 후 저장 시 갱신)
+# handle_daily_check의 감쇠는 재계산 결과와 다를 수 있어서, 이 날짜가 오늘일 때만 증분 반영
+_profile_synced_date: str | None = None
+
+def save_profile_dict(p: dict):
+    global _profile_synced_date
+    # profile row를 통째로 업데이트(캐시도 같이 갱신)
+    update_profile(p)
+    _profile_synced_date = p["last_check_date"]
+
+def last_action_dates() -> dict[str, str]:
+    # 타입별 마지막 행동 날짜를 쿼리 한 번으로 (idx_actions_type_date 사용)
     conn = db()
-    row = conn.execute("""
-        SELECT date FROM actions
-        WHERE type=?
-        ORDER BY date DESC
-        LIMIT 1
-    """, (t,)).fetchone()
-    conn.close()
-    return row["date"] if row else None
+    rows = conn.execute("SELECT type, MAX(date) AS d FROM actions GROUP BY type").fetchall()
+    return {r["type"]: r["d"] for r in rows}
 
 def apply_weekly_decay(p: dict, current_date: str):
     """
@@ -353,8 +486,9 @@ def apply_weekly_decay(p: dict, current_date: str):
     최근 7일 동안 해당 타입 행동이 0회면 해당 스탯 -2 (최저 0)
     """
     cur_d = parse_date(current_date)
+    last_date_for = last_action_dates()
     for t in ACTION_TYPES:
-        last_d_str = last_action_date_for_type(t)
+        last_d_str = last_date_for.get(t)
         if not last_d_str:
             continue
         last_d = parse_date(last_d_str)
@@ -362,33 +496,26 @@ def apply_weekly_decay(p: dict, current_date: str):
             p[t] = max(0, p[t] - 2)
 
 def compute_class_and_traits(p: dict):
+    # 같은 스탯 조합이면 결과도 같으므로 스탯 값 튜플로 메모이즈
+    return _class_and_traits(tuple(p[k] for k in STAT_KEYS))
+
+@lru_cache(maxsize=256)
+def _class_and_traits(values: tuple):
     # 1위 스탯(6개 중) 기준 클래스
-    stats = {k: p[k] for k in STAT_KEYS}
-    sorted_stats = sorted(stats.items(), key=lambda kv: kv[1], reverse=True)
+    stats = dict(zip(STAT_KEYS, values))
+    # 랭킹 화면에 전체 순위가 필요해서 전부 뽑음(sorted(..., reverse=True)와 같은 순서)
+    # 캐시된 결과를 여러 요청이 공유하므로 수정 불가능한 튜플로
+    sorted_stats = tuple(heapq.nlargest(len(stats), stats.items(), key=lambda kv: kv[1]))
     top1, v1 = sorted_stats[0]
     top2, v2 = sorted_stats[1]
     top3, v3 = sorted_stats[2]
 
-    base_class = {
-        "strength": "보디빌더",
-        "stamina": "러너",
-        "intelligence": "학자",
-        "wealth": "재력가",
-        "discipline": "현자",
-        "consistency": "맑은눈",  # 꾸준함 1위면 맑은눈 성향
-    }[top1]
+    base_class = CLASS_BY_STAT[top1]
 
     # 멀티 특성: 2위가 1위의 70% 이상이면 활성화 (v1=0이면 예외)
     trait = None
     if v1 > 0 and v2 >= int(v1 * 0.7):
-        trait = {
-            "strength": "보디빌더",
-            "stamina": "러너",
-            "intelligence": "학자",
-            "wealth": "재력가",
-            "discipline": "현자",
-            "consistency": "맑은눈",
-        }[top2]
+        trait = CLASS_BY_STAT[top2]
 
     # 맑은눈 확장형: 상위3개 차이가 10 이내면
     title = None
@@ -398,12 +525,17 @@ def compute_class_and_traits(p: dict):
     return base_class, trait, title, sorted_stats
 
 def layer_flags(p: dict):
+    return _layer_flags(tuple(p[k] for k in STAT_KEYS))
+
+@lru_cache(maxsize=256)
+def _layer_flags(values: tuple):
     # MVP 기준 20/50 두 단계
     flags = {}
-    for k in STAT_KEYS:
-        flags[f"{k}_20"] = p[k] >= 20
-        flags[f"{k}_50"] = p[k] >= 50
-    return flags
+    for (k20, k50), v in zip(LAYER_KEYS, values):
+        flags[k20] = v >= 20
+        flags[k50] = v >= 50
+    # 캐시된 dict를 여러 요청이 공유하므로 읽기 전용으로 감싸서 반환
+    return MappingProxyType(flags)
 
 def handle_daily_check(p: dict, current_date: str):
     """
@@ -411,101 +543,155 @@ def handle_daily_check(p: dict, current_date: str):
       - 어제 입력했는지로 streak 갱신
       - 감쇠 적용
       - last_check_date 갱신
+    반환: (p, dirty) — dirty면 profile을 DB에 저장해야 함
     """
-    last = parse_date(p["last_check_date"])
-    cur = parse_date(current_date)
-    if cur <= last:
-        return p
+    last_ord = parse_date(p["last_check_date"]).toordinal()
+    cur_ord = parse_date(current_date).toordinal()
+    if cur_ord <= last_ord:
+        return p, False
+
+    # 지나간 기간 중 기록 있는 날짜를 쿼리 한 번으로
+    conn = db()
+    rows = conn.execute(
+        "SELECT DISTINCT date FROM actions WHERE date > ? AND date <= ?",
+        (p["last_check_date"], current_date)
+    ).fetchall()
+    active = {parse_date(r["date"]).toordinal() for r in rows}
 
     # 하루씩 지나간 것 처리(공백일 포함)
-    d = last + timedelta(days=1)
-    while d <= cur:
-        d_str = d.isoformat()
+    for o in range(last_ord + 1, cur_ord + 1):
         # streak는 "그날 1개 이상 입력" 기준
-        if did_anything_on(d_str):
+        if o in active:
             p["streak"] += 1
         else:
             p["streak"] = 0
         # 감쇠는 현재 날짜 기준으로 판단(단순화: 체크 시점에만 한 번 적용)
-        d = d + timedelta(days=1)
 
     # 감쇠 적용(현재 날짜 기준)
     apply_weekly_decay(p, current_date)
+    # 날짜가 바뀐 경우 last_check_date가 항상 바뀌므로 저장 필요
     p["last_check_date"] = current_date
-    return p
+    return p, True
 
 def add_actions(date_str: str, selected: list[str], note: str | None):
+    # 여러 행동을 한 트랜잭션(커밋 1번)으로 저장
+    rows = [(date_str, t, note if note else None) for t in selected]
     conn = db()
-    for t in selected:
-        conn.execute("INSERT INTO actions (date, type, amount, note) VALUES (?, ?, 1, ?)",
-                     (date_str, t, note if note else None))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany("INSERT INTO actions (date, type, amount, note) VALUES (?, ?, 1, ?)", rows)
 
-@app.route("/", methods=["GET"])
-def index():
-    init_db()
-    p = get_profile()
-
-    # 날짜 체크(스트릭/감쇠)
-    p = handle_daily_check(p, today_str())
-    update_profile(p)
+# index 렌더 결과 캐시: {(version, today, profile): (etag, html)}
+# 같은 날 + 같은 profile + 그 사이 쓰기 없음이면 DB 조회/Jinja 렌더 생략
+_index_page_cache: dict = {}
+# 쓰기마다 올라가는 번호: 렌더 도중 쓰기가 끼면 그 렌더 결과는 저장하지 않음
+_index_cache_version = 0
 
-    base_class, trait, title, sorted_stats = compute_class_and_traits(p)
-    flags = layer_flags(p)
+def invalidate_index_cache():
+    # 기록 추가/수정/삭제 등 쓰기 후 호출(_write_lock 안에서)
+    global _index_cache_version
+    _index_cache_version += 1
+    _index_page_cache.clear()
 
-    recent_actions = get_recent_actions(30)
-
-    return render_template(
-    "index.html",
-    p=p,
-    need=need_exp_for_next(p["level"]),
-    base_class=base_class,
-    trait=trait,
-    title=title,
-    sorted_stats=sorted_stats,
-    flags=flags,
-    recent_actions=recent_actions,
-    today=today_str()
-    )
+@app.route("/", methods=["GET"])
+def index():
+    today = today_str()
+    with _write_lock:
+        # profile과 같은 시점의 쓰기 번호
+        version = _index_cache_version
+        p = get_profile()
+
+        # 날짜 체크(스트릭/감쇠)
+        p, dirty = handle_daily_check(p, today)
+        # 같은 날 새로고침이면 바뀐 게 없으니 UPDATE/commit 생략
+        if dirty:
+            update_profile(p)
+
+    key = (version, today, tuple(sorted(p.items())))
+    cached = _index_page_cache.get(key)
+    if cached is None:
+        base_class, trait, title, sorted_stats = compute_class_and_traits(p)
+        flags = layer_flags(p)
+
+        recent_actions = get_recent_actions(30)
+
+        html = render_template(
+        "index.html",
+        p=p,
+        need=need_exp_for_next(p["level"]),
+        base_class=base_class,
+        trait=trait,
+        title=title,
+        sorted_stats=sorted_stats,
+        flags=flags,
+        recent_actions=recent_actions,
+        today=today
+        )
+        # 같은 key라도 쓰기 후엔 내용이 다를 수 있으므로 ETag는 html 내용 기준
+        cached = (hashlib.sha1(html.encode("utf-8")).hexdigest(), html)
+        # 렌더하는 동안 쓰기가 없었을 때만 저장(있었으면 recent_actions가 이미 낡았을 수 있음)
+        if version == _index_cache_version:
+            _index_page_cache.clear()  # 최신 상태 하나만 보관
+            _index_page_cache[key] = cached
+
+    etag, html = cached
+    resp = make_response(html)
+    resp.set_etag(etag)
+    # If-None-Match가 같으면 304
+    return resp.make_conditional(request)
 
 @app.route("/log", methods=["POST"])
 def log_today():
-    init_db()
-
     d = request.form.get("date", "").strip()
-    if not d:
+    if not is_valid_date(d):
         d = today_str()
 
-    try:
-        _ = parse_date(d)
-    except Exception:
-        d = today_str()
-
-
-
     selected = request.form.getlist("actions")
     note = request.form.get("note", "").strip()
 
     if not selected:
         return redirect(url_for("index"))
 
-    # 기록 저장 (스탯 계산은 여기서 하지 않음)
-    conn = db()
-    for t in selected:
-        conn.execute(
-            "INSERT INTO actions (date, type, amount, note) VALUES (?, ?, 1, ?)",
-            (d, t, note if note else None)
-        )
-    conn.commit()
-    conn.close()
-
-    # ✅ 여기서 profile 전체 재계산
-    new_p = recompute_profile_from_actions()
-    save_profile_dict(new_p)
+    today = today_str()
+    # get_profile()부터 save_profile_dict()까지 한 번에(동시 기록 시 증분이 유실되지 않게)
+    with _write_lock:
+        p = get_profile()
+        # 오늘 날짜 기록이고 profile이 오늘 actions 기준으로 맞춰져 있으면 증분 반영, 아니면 전체 재계산
+        incremental = d == today and p["last_check_date"] == today and _profile_synced_date == today
+        if incremental:
+            # insert 전에 확인해야 하는 것들
+            first_today = not did_anything_on(d)
+            # 타입별 마지막 날짜는 타입마다 따로 묻지 않고 한 번에
+            last_date_for = last_action_dates()
+            revived = []
+            for t in set(selected):
+                last_d_str = last_date_for.get(t) if t in GAIN else None
+                if last_d_str and (parse_date(d) - parse_date(last_d_str)).days >= 7:
+                    revived.append(t)
+
+        # 기록 저장
+        add_actions(d, selected, note)
+
+        if incremental:
+            if first_today:
+                p["streak"] = streak_before(d)
+            # 감쇠(-2) 받던 스탯은 오늘 기록으로 감쇠 해제
+            for t in revived:
+                p[t] += 2
+            for i, t in enumerate(selected):
+                apply_action_delta(p, d, t, first_today and i == 0)
+            new_p = p
+        else:
+            # 과거 날짜 기록 등은 profile 전체 재계산
+            new_p = recompute_profile_from_actions()
+        save_profile_dict(new_p)
+        invalidate_index_cache()
 
     return redirect(url_for("index"))
 
+# 테이블/기본 profile 준비는 import 시 한 번만(요청마다 하지 않음, WSGI 실행에도 적용)
+with app.app_context():
+    _ensure_init()
+
 if __name__ == "__main__":
-    init_db()
-    app.run(debug=True)
\ No newline at end of file
+    # 단일 사용자 로컬 앱: 요청을 한 스레드에서 처리해 DB 연결을 계속 재사용
+    app.run(debug=True, threaded=False)
\ No newline at end of file